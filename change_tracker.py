@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from logger_config import setup_logger
+
+# Set up logger for this module
+logger = setup_logger(__name__, os.path.join("logs", "change_tracker.log"))
+
+# Directory where per-URL chunk snapshots are stored
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+
+def hash_chunk(chunk):
+    """Return a stable content hash for a chunk of cleaned text."""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def _snapshot_path(url, parse_description, model_name):
+    """Build the snapshot file path for a URL, query and model combination."""
+    key = json.dumps([url, parse_description, model_name or ""])
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f"{digest}.json")
+
+
+def load_snapshot(url, parse_description, model_name=None):
+    """
+    Load the chunk snapshot from the previous run for this URL.
+
+    Results depend on the query and the model, so each combination of
+    url, parse_description and model_name has its own snapshot.
+
+    Args:
+        url: URL that was scraped
+        parse_description: Description of what was extracted
+        model_name: Name of the model that was used
+
+    Returns:
+        Dictionary mapping chunk hashes to parsed results (empty if none)
+    """
+    path = _snapshot_path(url, parse_description, model_name)
+    if not os.path.exists(path):
+        logger.info("No previous snapshot for %s", url)
+        return {}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        chunk_results = {c["hash"]: c["result"] for c in snapshot.get("chunks", [])}
+        logger.info(
+            "Loaded snapshot for %s with %d chunks from %s",
+            url, len(chunk_results), snapshot.get("updated_at", "unknown time"),
+        )
+        return chunk_results
+    except Exception as e:
+        # A corrupt snapshot only costs a full re-parse
+        logger.warning("Failed to read snapshot for %s: %s", url, e)
+        return {}
+
+
+def save_snapshot(url, parse_description, model_name, dom_chunks, outcome):
+    """
+    Store chunk hashes and results from a parse for the next run.
+
+    Only chunks that parsed successfully are stored, so failed chunks are
+    sent to the LLM again next time.
+
+    Args:
+        url: URL that was scraped
+        parse_description: Description of what was extracted
+        model_name: Name of the model that was used
+        dom_chunks: List of DOM content chunks that were parsed
+        outcome: The dict returned by parse_chunks
+    """
+    failed = set(outcome["failed_chunks"])
+    chunks = [
+        {"hash": hash_chunk(chunk), "result": result}
+        for i, (chunk, result) in enumerate(zip(dom_chunks, outcome["results"]), start=1)
+        if i not in failed
+    ]
+    snapshot = {
+        "url": url,
+        "parse_description": parse_description,
+        "model": model_name,
+        "updated_at": datetime.now().isoformat(),
+        "chunks": chunks,
+    }
+
+    path = _snapshot_path(url, parse_description, model_name)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # Write to a unique temporary file first so a crash never leaves a
+        # partial snapshot and concurrent writers never share a temp file
+        fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        logger.info("Saved snapshot for %s with %d chunks", url, len(chunks))
+    except Exception as e:
+        logger.error("Failed to save snapshot for %s: %s", url, e)
+
+
+def diff_chunks(dom_chunks, chunk_results):
+    """
+    Compare new chunks against a previous snapshot.
+
+    Args:
+        dom_chunks: List of DOM content chunks from the new scrape
+        chunk_results: Dictionary of chunk hashes to results from load_snapshot
+
+    Returns:
+        tuple: (results, changed_chunks) where results holds reused results
+        for unchanged chunks and changed_chunks lists the 1-based indices
+        of chunks that are new or have changed
+    """
+    results = []
+    changed_chunks = []
+
+    for i, chunk in enumerate(dom_chunks, start=1):
+        chunk_hash = hash_chunk(chunk)
+        if chunk_hash in chunk_results:
+            results.append(chunk_results[chunk_hash])
+        else:
+            results.append(f"[Chunk {i} not processed]")
+            changed_chunks.append(i)
+
+    logger.info(
+        "%d of %d chunks are new or changed", len(changed_chunks), len(dom_chunks)
+    )
+    return results, changed_chunks
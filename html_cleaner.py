@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from logger_config import setup_logger
+
+# Logger for this module, set up on first use (see _get_logger)
+_logger = None
+
+# Batch callers may import this module directly, so load .env here as well
+load_dotenv()
+
+# Process pool settings for batch cleaning (overridable via environment variables)
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", "0")) or os.cpu_count() or 1
+CLEAN_BATCH_SIZE = int(os.getenv("CLEAN_BATCH_SIZE", "4"))
+CLEAN_TASKS_PER_CHILD = int(os.getenv("CLEAN_TASKS_PER_CHILD", "50"))
+
+
+def extract_body(html_content):
+    """Return the <body> element of an HTML document as a string ("" if missing)."""
+    soup = BeautifulSoup(html_content, "html.parser")
+    body_content = soup.body
+    return str(body_content) if body_content else ""
+
+
+def clean_text(body_content):
+    """Strip scripts and styles from HTML and return its non-empty text lines."""
+    soup = BeautifulSoup(body_content, "html.parser")
+
+    # Remove script and style elements
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.extract()
+
+    # Get text content and clean whitespace
+    cleaned_content = soup.get_text(separator="\n")
+    return "\n".join(
+        line.strip() for line in cleaned_content.splitlines() if line.strip()
+    )
+
+
+def html_to_text(html_content):
+    """Run the full HTML-to-text stage on a single document."""
+    return clean_text(extract_body(html_content))
+
+
+def _clean_batch(html_documents):
+    """
+    Worker task: clean a batch of documents.
+
+    Errors are returned instead of raised so one bad page does not fail the
+    rest of its batch.
+
+    Returns:
+        List of (cleaned_text, error_message) tuples
+    """
+    results = []
+    for html_content in html_documents:
+        try:
+            results.append((html_to_text(html_content), None))
+        except Exception as e:
+            results.append(("", str(e)))
+    return results
+
+
+def _get_logger():
+    """
+    Set up this module's logger the first time it is needed.
+
+    Pool workers import this module but never log, so setting the logger up
+    lazily keeps them from opening the log file or starting a log writer.
+    """
+    global _logger
+    if _logger is None:
+        _logger = setup_logger(__name__, os.path.join("logs", "html_cleaner.log"))
+    return _logger
+
+
+def _batched(iterable, size):
+    """Yield lists of up to `size` items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def clean_html_batch(
+    html_documents,
+    workers=None,
+    batch_size=CLEAN_BATCH_SIZE,
+    max_in_flight=None,
+    max_tasks_per_child=CLEAN_TASKS_PER_CHILD,
+):
+    """
+    Convert many HTML documents to cleaned text using a process pool.
+
+    BeautifulSoup parsing is CPU-bound and holds the GIL, so large batches
+    are spread across worker processes. Documents are read lazily from
+    html_documents and at most max_in_flight batches are submitted at once,
+    which bounds memory use for very large inputs. Workers are replaced
+    after max_tasks_per_child batches to release memory held by long-lived
+    processes.
+
+    If a worker process dies (for example, OOM-killed on a huge page), the
+    pool is rebuilt. The affected batch is re-cleaned one document at a
+    time, so only the document that kills a worker is lost. Other in-flight
+    batches are resubmitted.
+
+    Args:
+        html_documents: Iterable of HTML strings
+        workers: Number of worker processes (default: CLEAN_WORKERS);
+            1 cleans in the current process
+        batch_size: Number of documents sent to a worker per task
+        max_in_flight: Maximum number of batches submitted but not yet
+            consumed (default: twice the number of workers)
+        max_tasks_per_child: Batches a worker handles before it is replaced
+
+    Yields:
+        Cleaned text for each document, in input order ("" for documents
+        that failed to clean; failures are logged)
+    """
+    logger = _get_logger()
+    workers = workers or CLEAN_WORKERS
+    max_in_flight = max_in_flight or workers * 2
+    logger.info(
+        "Cleaning HTML batch with %d workers, batch size %d, max %d batches in flight",
+        workers, batch_size, max_in_flight,
+    )
+
+    def unpack(batch_start, batch_results):
+        for offset, (text, error) in enumerate(batch_results):
+            if error is not None:
+                logger.error(
+                    "Error cleaning document %d: %s", batch_start + offset, error
+                )
+            yield text
+
+    if workers == 1:
+        for start, batch in enumerate(_batched(html_documents, batch_size)):
+            yield from unpack(start * batch_size, _clean_batch(batch))
+        return
+
+    # Spawned workers do not inherit the parent's threads or open handlers
+    context = multiprocessing.get_context("spawn")
+
+    def new_executor():
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            max_tasks_per_child=max_tasks_per_child,
+        )
+
+    executor = new_executor()
+    pending = deque()
+    completed = 0
+
+    def restart_executor():
+        nonlocal executor
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = new_executor()
+
+    def collect():
+        """Wait for the oldest batch, recovering the pool if a worker died."""
+        batch_start, batch, future = pending.popleft()
+        try:
+            return batch_start, future.result()
+        except BrokenProcessPool:
+            logger.warning(
+                "Worker process died while cleaning documents %d-%d; restarting pool",
+                batch_start, batch_start + len(batch) - 1,
+            )
+        restart_executor()
+
+        # Clean the batch one document at a time before anything else runs,
+        # so a repeat failure can only come from that document
+        results = []
+        for html_content in batch:
+            try:
+                results.extend(executor.submit(_clean_batch, [html_content]).result())
+            except BrokenProcessPool:
+                results.append(("", "Worker process died while cleaning document"))
+                restart_executor()
+
+        # Batches that were in flight on the broken pool must be resubmitted
+        for i in range(len(pending)):
+            other_start, other_batch, other_future = pending[i]
+            if other_future.done() and other_future.exception() is None:
+                continue
+            pending[i] = (
+                other_start,
+                other_batch,
+                executor.submit(_clean_batch, other_batch),
+            )
+        return batch_start, results
+
+    try:
+        for start, batch in enumerate(_batched(html_documents, batch_size)):
+            if len(pending) >= max_in_flight:
+                yield from unpack(*collect())
+                completed += 1
+            pending.append(
+                (start * batch_size, batch, executor.submit(_clean_batch, batch))
+            )
+
+        while pending:
+            yield from unpack(*collect())
+            completed += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    logger.info("Finished cleaning %d batches", completed)
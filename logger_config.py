@@ -1,51 +1,193 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from dotenv import load_dotenv
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import sys
 
+# Load .env before reading settings; every module imports this one first, so
+# settings read at import time elsewhere (PARSE_*, SNAPSHOT_DIR) see it too
+load_dotenv()
+
+# Process-wide logging options, set through environment variables
+LOG_ASYNC = os.getenv("LOG_ASYNC", "false").lower() in ("1", "true", "yes")
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+
+# Shared background writer used when LOG_ASYNC is enabled
+_lock = threading.Lock()
+_log_queue = None
+_listener = None
+_file_router = None
+_file_handlers = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Queue handler that merges %-style arguments in the calling thread.
+
+    Like the standard QueueHandler, the message is built before the record
+    is queued, so mutable arguments are logged as they were at call time.
+    Unlike it, the traceback is kept in exc_text instead of being folded
+    into the message, so the writer's formatter can still place it.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _FileRouter(logging.Handler):
+    """Send each queued record to the log file registered for its logger."""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def emit(self, record):
+        handler = self.routes.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+
+def _create_formatter():
+    """Build the formatter selected by LOG_JSON."""
+    if LOG_JSON:
+        return JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+    return logging.Formatter(
+        '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def _create_file_handler(log_file, formatter):
+    """Create a rotating file handler, making the log directory if needed."""
+    # Create logs directory if it doesn't exist
+    log_dir = os.path.dirname(log_file)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # Set up rotating file handler (10 MB max size, keep 5 backup files)
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=10*1024*1024, backupCount=5
+    )
+    file_handler.setFormatter(formatter)
+    return file_handler
+
+
+def _start_listener():
+    """Start the shared queue and background writer once per process."""
+    global _log_queue, _listener, _file_router
+    if _listener is not None:
+        return
+
+    formatter = _create_formatter()
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    _file_router = _FileRouter()
+    _file_router.setFormatter(formatter)
+
+    _log_queue = queue.SimpleQueue()
+    _listener = QueueListener(
+        _log_queue, console_handler, _file_router, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush and stop the background log writer."""
+    global _log_queue, _listener, _file_router
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for handler in _file_handlers.values():
+            handler.close()
+        _file_handlers.clear()
+        _log_queue = _listener = _file_router = None
+
+
+atexit.register(shutdown_logging)
+
+
 def setup_logger(name, log_file=None, level=logging.INFO):
     """
     Set up a logger with console and optional file output.
-    
+
+    With LOG_ASYNC enabled, the logger only gets a queue handler; a single
+    background thread shared by all loggers writes to the console and to
+    each logger's file. LOG_JSON switches the output to JSON lines.
+
     Args:
         name: Logger name (typically __name__ from the calling module)
         log_file: Optional path to log file
         level: Logging level (default: INFO)
-    
+
     Returns:
         Configured logger instance
     """
     # Create logger
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
+
     # Clear existing handlers to avoid duplicate logs
     if logger.handlers:
         logger.handlers.clear()
-    
+
+    if LOG_ASYNC:
+        with _lock:
+            _start_listener()
+            if log_file:
+                # Loggers sharing a file share one handler, created on first use
+                path = os.path.abspath(log_file)
+                if path not in _file_handlers:
+                    _file_handlers[path] = _create_file_handler(
+                        log_file, _file_router.formatter
+                    )
+                _file_router.routes[name] = _file_handlers[path]
+            else:
+                _file_router.routes.pop(name, None)
+            logger.addHandler(LogQueueHandler(_log_queue))
+        return logger
+
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
+    formatter = _create_formatter()
+
     # Add console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
-    
+
     # Add file handler if log_file is specified
     if log_file:
-        # Create logs directory if it doesn't exist
-        log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        # Set up rotating file handler (10 MB max size, keep 5 backup files)
-        file_handler = RotatingFileHandler(
-            log_file, maxBytes=10*1024*1024, backupCount=5
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
+        logger.addHandler(_create_file_handler(log_file, formatter))
+
     return logger
@@ -3,14 +3,23 @@ import streamlit as st
 import json
 import base64
 import requests
+import threading
+import time
 from datetime import datetime
 from scrape import (
     scrape_website,
     extract_body_content,
     clean_body_content,
     split_dom_content,
+    split_dom_content_stable,
 )
-from parse import parse_with_ollama, AVAILABLE_MODELS
+from parse import (
+    parse_chunks,
+    parse_incremental,
+    retry_failed_chunks,
+    AVAILABLE_MODELS,
+)
+from change_tracker import save_snapshot
 from logger_config import setup_logger
 from health import add_health_status_sidebar
 
@@ -24,6 +33,9 @@ logger.info("Starting AI DataHarvester application")
 if "ollama_override" not in st.session_state:
     st.session_state.ollama_override = False
 
+# How often the UI checks on a parse running in the background
+PARSE_POLL_SECONDS = 0.5
+
 
 def safe_scrape_website(url):
     """Safely scrape a website and handle exceptions appropriately in Streamlit."""
@@ -74,12 +86,28 @@ def get_download_link(content, filename, text):
     return f'<a href="{href}" download="{filename}">{text}</a>'
 
 
+def clear_parse_state():
+    """Drop parse results and stop any running parse for the current content."""
+    if "parse_job" in st.session_state:
+        # Stop the background parse; its result is no longer wanted
+        st.session_state.parse_job["cancel_event"].set()
+        del st.session_state.parse_job
+    for key in (
+        "parsed_result",
+        "parse_outcome",
+        "dom_chunks",
+        "chunks_incremental",
+        "parse_context",
+    ):
+        if key in st.session_state:
+            del st.session_state[key]
+
+
 def reset_session():
     """Reset all session state variables related to scraping and parsing."""
     if "dom_content" in st.session_state:
         del st.session_state.dom_content
-    if "parsed_result" in st.session_state:
-        del st.session_state.parsed_result
+    clear_parse_state()
     if "url" in st.session_state:
         del st.session_state.url
     logger.info("Session state reset")
@@ -125,6 +153,130 @@ def send_to_webhook(data, webhook_url):
         return False, f"Error: {str(e)}"
 
 
+def cancel_parsing():
+    """Signal the background parse to abort its current request and stop."""
+    if "parse_job" in st.session_state:
+        st.session_state.parse_job["cancel_event"].set()
+        logger.info("Parse cancellation requested")
+
+
+def start_parse_job(
+    parse_description, model_name, deadline=None, retry=False, incremental=False
+):
+    """
+    Start (or retry) parsing in a background thread.
+
+    The parse runs outside the script thread so that a Streamlit rerun, such
+    as the one triggered by the cancel button, cannot interrupt it and lose
+    the chunks that already finished. wait_for_parse_job collects the result.
+
+    A retry reuses the chunks from the previous parse, so it also reuses
+    that parse's query, model, URL and incremental setting rather than the
+    current widget values; see start_retry_job.
+    """
+    # Only one parse runs per session; stop any job that is still going
+    if "parse_job" in st.session_state:
+        st.session_state.parse_job["cancel_event"].set()
+
+    # Each job gets its own event so cancelling one never affects another
+    job = {
+        "progress": (0, 0),
+        "outcome": None,
+        "error": None,
+        "cancel_event": threading.Event(),
+    }
+
+    def update_progress(completed, total):
+        job["progress"] = (completed, total)
+
+    options = {
+        "deadline": deadline,
+        "cancel_event": job["cancel_event"],
+        "progress_callback": update_progress,
+    }
+    previous = None
+
+    if retry:
+        dom_chunks = st.session_state.dom_chunks
+        previous = st.session_state.parse_outcome
+        incremental = st.session_state.get("chunks_incremental", False)
+        url = st.session_state.parse_context["url"]
+    else:
+        if incremental:
+            dom_chunks = split_dom_content_stable(st.session_state.dom_content)
+        else:
+            dom_chunks = split_dom_content(st.session_state.dom_content)
+        url = st.session_state.get("url", "")
+        # Results of an earlier parse must never be mixed with this one
+        for key in ("parse_outcome", "parsed_result"):
+            if key in st.session_state:
+                del st.session_state[key]
+        # Remember what the chunks were parsed with so a retry stays consistent
+        st.session_state.dom_chunks = dom_chunks
+        st.session_state.chunks_incremental = incremental
+        st.session_state.parse_context = {
+            "url": url,
+            "parse_description": parse_description,
+            "model_name": model_name,
+        }
+
+    def run():
+        try:
+            if retry:
+                outcome = retry_failed_chunks(
+                    dom_chunks, parse_description, previous, model_name, **options
+                )
+                if incremental:
+                    # Record the retried chunks so the next run can reuse them
+                    save_snapshot(url, parse_description, model_name, dom_chunks, outcome)
+            elif incremental:
+                outcome = parse_incremental(
+                    url, dom_chunks, parse_description, model_name, **options
+                )
+            else:
+                outcome = parse_chunks(
+                    dom_chunks, parse_description, model_name, **options
+                )
+            job["outcome"] = outcome
+        except Exception as e:
+            job["error"] = e
+
+    job["thread"] = threading.Thread(target=run, daemon=True)
+    st.session_state.parse_job = job
+    job["thread"].start()
+    logger.info(f"Started background parse (retry={retry}, incremental={incremental})")
+
+
+def start_retry_job(deadline=None):
+    """Retry the failed chunks with the query, model and URL of the last parse."""
+    context = st.session_state.parse_context
+    start_parse_job(
+        context["parse_description"], context["model_name"], deadline, retry=True
+    )
+
+
+def wait_for_parse_job():
+    """Show progress for the background parse and store its outcome when done."""
+    job = st.session_state.parse_job
+    st.button("⏹ Cancel Parsing", on_click=cancel_parsing)
+    progress_bar = st.progress(0.0)
+
+    while job["thread"].is_alive():
+        completed, total = job["progress"]
+        progress_bar.progress(completed / total if total else 0.0)
+        time.sleep(PARSE_POLL_SECONDS)
+
+    progress_bar.empty()
+    del st.session_state.parse_job
+    if job["error"] is not None:
+        raise job["error"]
+
+    outcome = job["outcome"]
+    st.session_state.parse_outcome = outcome
+    st.session_state.parsed_result = "\n".join(outcome["results"])
+    return outcome
+
+
 # Add health status sidebar - MUST be before any other Streamlit UI elements
 add_health_status_sidebar()
 
@@ -164,6 +316,9 @@ if st.button("Scrape Website"):
                 # Store the DOM content in Streamlit session state
                 st.session_state.dom_content = cleaned_content
 
+                # Results and retries for the previous content no longer apply
+                clear_parse_state()
+
                 # Display the DOM content in an expandable text box
                 with st.expander("View DOM Content"):
                     st.text_area("DOM Content", cleaned_content, height=300)
@@ -182,32 +337,73 @@ if "dom_content" in st.session_state:
         index=1,  # Default to llama3.2
     )
 
-    if st.button("Parse Content"):
-        logger.info(f"Parse button clicked with model: {model_name}")
-        if parse_description:
-            with st.spinner("Parsing the content..."):
-                logger.info(f"Parsing content with description: {parse_description}")
-
-                try:
-                    # Parse the content with Ollama
-                    dom_chunks = split_dom_content(st.session_state.dom_content)
-                    parsed_result = parse_with_ollama(
-                        dom_chunks, parse_description, model_name
-                    )
+    # Overall time budget for a parse (0 means no limit)
+    parse_deadline = st.number_input(
+        "Parse time limit (seconds, 0 = no limit)",
+        min_value=0,
+        value=0,
+        step=30,
+    )
 
-                    # Save parsed result to session state
-                    st.session_state.parsed_result = parsed_result
+    # Incremental mode reuses results for chunks unchanged since the last run
+    incremental = st.checkbox(
+        "Only parse content that changed since the last run",
+        help="Reuses earlier results for unchanged parts of this URL",
+    )
 
-                    # Display the parsed result
-                    st.write(parsed_result)
-                    logger.info("Content parsed successfully")
-                except Exception as e:
-                    st.error(f"Error parsing content: {str(e)}")
-                    logger.error(f"Error during parsing: {str(e)}", exc_info=True)
+    # Parsing is disabled while a parse is already running in the background
+    if st.button("Parse Content", disabled="parse_job" in st.session_state):
+        logger.info(f"Parse button clicked with model: {model_name}")
+        if parse_description:
+            logger.info(f"Parsing content with description: {parse_description}")
+            try:
+                # Parse the content with Ollama
+                start_parse_job(
+                    parse_description,
+                    model_name,
+                    parse_deadline or None,
+                    incremental=incremental,
+                )
+            except Exception as e:
+                st.error(f"Error parsing content: {str(e)}")
+                logger.error(f"Error starting parse: {str(e)}", exc_info=True)
         else:
             st.error("Please provide a description of what to parse")
             logger.warning("Parse button clicked without description")
 
+    # Follow a parse running in the background, including across reruns
+    if "parse_job" in st.session_state:
+        with st.spinner("Parsing the content..."):
+            try:
+                outcome = wait_for_parse_job()
+                if "reused_chunks" in outcome:
+                    st.info(
+                        f"Reused {outcome['reused_chunks']} of "
+                        f"{len(outcome['results'])} chunks from the previous run"
+                    )
+
+                # Display the parsed result
+                st.write(st.session_state.parsed_result)
+                logger.info("Content parsed successfully")
+            except Exception as e:
+                st.error(f"Error parsing content: {str(e)}")
+                logger.error(f"Error during parsing: {str(e)}", exc_info=True)
+
+    # Offer to re-run only the chunks that failed or were not reached
+    if st.session_state.get("parse_outcome", {}).get("failed_chunks"):
+        outcome = st.session_state.parse_outcome
+        if outcome["cancelled"]:
+            st.warning("Parsing stopped early (cancelled or time limit reached).")
+        st.warning(f"Chunks not parsed successfully: {outcome['failed_chunks']}")
+
+        # The retry starts in the button callback and is followed on the next run
+        st.button(
+            "🔁 Retry Failed Chunks",
+            on_click=start_retry_job,
+            disabled="parse_job" in st.session_state,
+            args=(parse_deadline or None,),
+        )
+
 # Step 3: Show download and webhook options if parsed result exists
 if "parsed_result" in st.session_state:
     # Create JSON data structure
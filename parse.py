@@ -1,7 +1,10 @@
+import asyncio
 import os
+import time
 from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
 from logger_config import setup_logger
+from change_tracker import load_snapshot, save_snapshot, diff_chunks
 
 # Set up logger for this module
 logger = setup_logger(__name__, os.path.join('logs', 'parser.log'))
@@ -30,60 +33,304 @@ AVAILABLE_MODELS = {
 DEFAULT_MODEL = "llama3.2:latest"
 
 
-def parse_with_ollama(dom_chunks, parse_description, model_name=None):
+# Per-chunk deadline and retry policy (overridable via environment variables)
+CHUNK_TIMEOUT_SECONDS = float(os.getenv("PARSE_CHUNK_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("PARSE_MAX_RETRIES", "2"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("PARSE_RETRY_BACKOFF", "2"))
+MAX_RETRY_BACKOFF_SECONDS = 30
+
+# How often an in-flight LLM call checks for cancellation
+CANCEL_POLL_SECONDS = 0.5
+
+
+class ParseCancelled(Exception):
+    """Raised internally when a parse is cancelled or runs past its deadline."""
+
+
+def _resolve_model(model_name):
+    """Map a model key from AVAILABLE_MODELS to an Ollama model tag."""
+    if model_name and model_name in AVAILABLE_MODELS:
+        return AVAILABLE_MODELS[model_name]
+    if model_name:
+        logger.warning("Model '%s' not found, defaulting to %s", model_name, DEFAULT_MODEL)
+    return DEFAULT_MODEL
+
+
+async def _ainvoke_with_timeout(chain, inputs, timeout, cancel_event):
     """
-    Parse DOM chunks using the specified Ollama model with error handling.
-    
+    Await chain.ainvoke for at most `timeout` seconds.
+
+    On timeout or cancellation the request task is cancelled and awaited,
+    which closes the HTTP connection so Ollama stops generating. No retry
+    can start while an earlier attempt is still running.
+
+    Raises:
+        TimeoutError: If the call does not finish in time
+        ParseCancelled: If cancel_event is set while waiting
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(chain.ainvoke(inputs))
+    deadline_at = loop.time() + timeout
+    try:
+        while True:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call timed out after {timeout:.1f} seconds")
+            done, _ = await asyncio.wait(
+                {task}, timeout=min(remaining, CANCEL_POLL_SECONDS)
+            )
+            if done:
+                return task.result()
+            if cancel_event is not None and cancel_event.is_set():
+                raise ParseCancelled("Parsing cancelled")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def _remaining(deadline_at):
+    """Seconds left until the overall deadline, or None if there is none."""
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def _parse_chunk(loop, chain, chunk, index, parse_description, chunk_timeout,
+                 max_retries, retry_backoff, deadline_at, cancel_event):
+    """
+    Parse a single chunk, retrying with exponential backoff on failure.
+
+    Raises:
+        ParseCancelled: If cancelled or the overall deadline is reached
+        Exception: The last error once all retries are exhausted
+    """
+    inputs = {"dom_content": chunk, "parse_description": parse_description}
+
+    for attempt in range(max_retries + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ParseCancelled("Parsing cancelled")
+
+        timeout = chunk_timeout
+        remaining = _remaining(deadline_at)
+        if remaining is not None:
+            if remaining <= 0:
+                raise ParseCancelled("Parse deadline reached")
+            timeout = min(timeout, remaining)
+
+        try:
+            return loop.run_until_complete(
+                _ainvoke_with_timeout(chain, inputs, timeout, cancel_event)
+            )
+        except ParseCancelled:
+            raise
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = min(retry_backoff * (2 ** attempt), MAX_RETRY_BACKOFF_SECONDS)
+            remaining = _remaining(deadline_at)
+            if remaining is not None and remaining <= delay:
+                raise
+            logger.warning(
+                "Chunk %d attempt %d/%d failed: %s. Retrying in %.1fs",
+                index, attempt + 1, max_retries + 1, e, delay,
+            )
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    raise ParseCancelled("Parsing cancelled")
+            else:
+                time.sleep(delay)
+
+
+def parse_chunks(
+    dom_chunks,
+    parse_description,
+    model_name=None,
+    chunk_indices=None,
+    previous_results=None,
+    chunk_timeout=CHUNK_TIMEOUT_SECONDS,
+    max_retries=MAX_RETRIES,
+    retry_backoff=RETRY_BACKOFF_SECONDS,
+    deadline=None,
+    cancel_event=None,
+    progress_callback=None,
+):
+    """
+    Parse DOM chunks with per-chunk timeouts, retries and cancellation.
+
     Args:
         dom_chunks: List of DOM content chunks to parse
         parse_description: Description of what to extract
         model_name: Name of the model to use (must be in AVAILABLE_MODELS)
-        
+        chunk_indices: Optional 1-based chunk indices to (re)parse; all others
+            are taken from previous_results
+        previous_results: Optional per-chunk results from an earlier run
+        chunk_timeout: Maximum seconds to wait for a single LLM call
+        max_retries: Number of retries per chunk after the first attempt
+        retry_backoff: Base delay in seconds, doubled after each retry
+        deadline: Optional overall time budget for the parse in seconds
+        cancel_event: Optional threading.Event; when set, the in-flight
+            request is aborted and no further chunks are parsed
+        progress_callback: Optional callable(completed, total)
+
     Returns:
-        Parsed results as a string
+        dict with keys:
+            results: List of per-chunk results (placeholders for failures)
+            failed_chunks: 1-based indices of chunks that did not succeed
+            cancelled: True if parsing stopped early
     """
-    logger.info(f"Starting parsing with description: {parse_description}")
-    
-    # Select model based on input, defaulting to llama3.2 if not specified or invalid
-    if model_name and model_name in AVAILABLE_MODELS:
-        model_to_use = AVAILABLE_MODELS[model_name]
+    total = len(dom_chunks)
+    if chunk_indices is None:
+        chunk_indices = list(range(1, total + 1))
     else:
-        if model_name:
-            logger.warning(f"Model '{model_name}' not found, defaulting to {DEFAULT_MODEL}")
-        model_to_use = DEFAULT_MODEL
+        chunk_indices = sorted(set(i for i in chunk_indices if 1 <= i <= total))
 
-    logger.info(f"Using model: {model_to_use}")
+    if previous_results is not None and len(previous_results) == total:
+        results = list(previous_results)
+    else:
+        results = [f"[Chunk {i} not processed]" for i in range(1, total + 1)]
+
+    logger.info("Starting parsing with description: %s", parse_description)
+
+    model_to_use = _resolve_model(model_name)
+    logger.info("Using model: %s", model_to_use)
 
     # Initialize the model
     try:
         model = OllamaLLM(model=model_to_use)
     except Exception as e:
-        logger.error(f"Failed to initialize Ollama model '{model_to_use}': {str(e)}")
+        logger.error("Failed to initialize Ollama model '%s': %s", model_to_use, e)
         raise RuntimeError(f"Model initialization failed: {str(e)}")
 
     # Set up the chain
     prompt = ChatPromptTemplate.from_template(template)
     chain = prompt | model
 
-    parsed_results = []
+    deadline_at = time.monotonic() + deadline if deadline else None
     failed_chunks = []
+    cancelled = False
+
+    # One event loop per parse, so timed-out requests can be cancelled
+    loop = asyncio.new_event_loop()
+    try:
+        for position, i in enumerate(chunk_indices, start=1):
+            if cancelled:
+                failed_chunks.append(i)
+                results[i - 1] = f"[Chunk {i} not processed]"
+                continue
+
+            try:
+                logger.info("Processing chunk %d/%d", i, total)
+                results[i - 1] = _parse_chunk(
+                    loop, chain, dom_chunks[i - 1], i, parse_description,
+                    chunk_timeout, max_retries, retry_backoff, deadline_at,
+                    cancel_event,
+                )
+                logger.debug("Successfully processed chunk %d", i)
+            except ParseCancelled as e:
+                logger.warning("Stopping at chunk %d: %s", i, e)
+                cancelled = True
+                failed_chunks.append(i)
+                results[i - 1] = f"[Chunk {i} not processed]"
+            except Exception as e:
+                logger.error("Failed to parse chunk %d: %s", i, e)
+                failed_chunks.append(i)
+                # Add a placeholder for failed chunks
+                results[i - 1] = f"[Error processing chunk {i}]"
+
+            if progress_callback is not None:
+                progress_callback(position, len(chunk_indices))
+    finally:
+        loop.close()
 
-    for i, chunk in enumerate(dom_chunks, start=1):
-        try:
-            logger.info(f"Processing chunk {i}/{len(dom_chunks)}")
-            response = chain.invoke(
-                {"dom_content": chunk, "parse_description": parse_description}
-            )
-            parsed_results.append(response)
-            logger.debug(f"Successfully processed chunk {i}")
-        except Exception as e:
-            logger.error(f"Failed to parse chunk {i}: {str(e)}")
-            failed_chunks.append(i)
-            # Add a placeholder for failed chunks
-            parsed_results.append(f"[Error processing chunk {i}]")
-            
     if failed_chunks:
-        logger.warning(f"Failed to process chunks: {failed_chunks}")
+        logger.warning("Failed to process chunks: %s", failed_chunks)
+
+    logger.info(
+        "Parsing completed. Processed %d of %d chunks with %d failures",
+        len(chunk_indices), total, len(failed_chunks),
+    )
+    return {"results": results, "failed_chunks": failed_chunks, "cancelled": cancelled}
+
+
+def retry_failed_chunks(dom_chunks, parse_description, previous, model_name=None, **kwargs):
+    """
+    Re-run only the chunks that failed in a previous parse_chunks call.
+
+    Args:
+        dom_chunks: The same list of DOM chunks used for the previous run
+        parse_description: Description of what to extract
+        previous: The dict returned by the previous parse_chunks call
+        model_name: Name of the model to use
+        **kwargs: Timeout, retry and cancellation options for parse_chunks
+
+    Returns:
+        dict in the same shape as parse_chunks
+    """
+    logger.info("Retrying failed chunks: %s", previous["failed_chunks"])
+    return parse_chunks(
+        dom_chunks,
+        parse_description,
+        model_name,
+        chunk_indices=previous["failed_chunks"],
+        previous_results=previous["results"],
+        **kwargs,
+    )
+
+
+def parse_incremental(url, dom_chunks, parse_description, model_name=None, **kwargs):
+    """
+    Parse only the chunks that changed since the previous run for this URL.
+
+    Results for unchanged chunks are reused from the stored snapshot, and
+    the snapshot is updated afterwards. Use split_dom_content_stable to
+    build dom_chunks so that unchanged content keeps the same chunks.
+
+    Args:
+        url: URL the content was scraped from
+        dom_chunks: List of DOM content chunks to parse
+        parse_description: Description of what to extract
+        model_name: Name of the model to use (must be in AVAILABLE_MODELS)
+        **kwargs: Timeout, retry and cancellation options for parse_chunks
+
+    Returns:
+        dict in the same shape as parse_chunks, plus reused_chunks with the
+        number of chunks taken from the previous run
+    """
+    chunk_results = load_snapshot(url, parse_description, model_name)
+    previous_results, changed_chunks = diff_chunks(dom_chunks, chunk_results)
+    reused = len(dom_chunks) - len(changed_chunks)
+
+    if changed_chunks:
+        outcome = parse_chunks(
+            dom_chunks,
+            parse_description,
+            model_name,
+            chunk_indices=changed_chunks,
+            previous_results=previous_results,
+            **kwargs,
+        )
+    else:
+        logger.info("No changes detected for %s, reusing all %d chunk results", url, reused)
+        outcome = {"results": previous_results, "failed_chunks": [], "cancelled": False}
+
+    save_snapshot(url, parse_description, model_name, dom_chunks, outcome)
+    outcome["reused_chunks"] = reused
+    return outcome
+
+
+def parse_with_ollama(dom_chunks, parse_description, model_name=None, **kwargs):
+    """
+    Parse DOM chunks using the specified Ollama model with error handling.
     
-    logger.info(f"Parsing completed. Processed {len(dom_chunks)} chunks with {len(failed_chunks)} failures")
-    return "\n".join(parsed_results)
+    Args:
+        dom_chunks: List of DOM content chunks to parse
+        parse_description: Description of what to extract
+        model_name: Name of the model to use (must be in AVAILABLE_MODELS)
+        **kwargs: Timeout, retry and cancellation options for parse_chunks
+        
+    Returns:
+        Parsed results as a string
+    """
+    outcome = parse_chunks(dom_chunks, parse_description, model_name, **kwargs)
+    return "\n".join(outcome["results"])
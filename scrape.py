@@ -5,7 +5,8 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 from selenium.webdriver.common.by import By
 import time
-from bs4 import BeautifulSoup
+import zlib
+from html_cleaner import extract_body, clean_text
 from logger_config import setup_logger
 
 # Set up logger for this module
@@ -38,11 +39,11 @@ def scrape_website(website):
     Returns:
         HTML content of the website
     """
-    logger.info(f"Scraping website: {website}")
+    logger.info("Scraping website: %s", website)
     
     # Validate URL format before attempting to scrape
     if not website.startswith(('http://', 'https://')):
-        logger.error(f"Invalid URL format: {website}")
+        logger.error("Invalid URL format: %s", website)
         raise ValueError("URL must start with http:// or https://")
     
     # Use remote connection instead of local ChromeDriver
@@ -52,7 +53,7 @@ def scrape_website(website):
         sbr_connection = ChromiumRemoteConnection(SBR_WEBDRIVER, "goog", "chrome")
         options = webdriver.ChromeOptions()
     except Exception as e:
-        logger.error(f"Failed to initialize Chrome connection: {str(e)}")
+        logger.error("Failed to initialize Chrome connection: %s", e)
         raise ConnectionError(f"Browser connection initialization failed: {str(e)}")
 
     # Create driver with remote connection
@@ -81,7 +82,7 @@ def scrape_website(website):
             return html
             
         except Exception as e:
-            logger.error(f"Error during page navigation or scraping: {str(e)}")
+            logger.error("Error during page navigation or scraping: %s", e)
             raise
         finally:
             # Ensure driver is always closed
@@ -89,7 +90,7 @@ def scrape_website(website):
             driver.quit()
             
     except Exception as e:
-        logger.error(f"Failed to create Remote WebDriver: {str(e)}")
+        logger.error("Failed to create Remote WebDriver: %s", e)
         raise ConnectionError(f"Browser connection failed: {str(e)}")
 
 
@@ -97,15 +98,14 @@ def extract_body_content(html_content):
     """Extract body content from HTML"""
     logger.info("Extracting body content from HTML")
     try:
-        soup = BeautifulSoup(html_content, "html.parser")
-        body_content = soup.body
+        body_content = extract_body(html_content)
         if body_content:
             logger.info("Body content extracted successfully")
-            return str(body_content)
+            return body_content
         logger.warning("No body content found in HTML")
         return ""
     except Exception as e:
-        logger.error(f"Error extracting body content: {str(e)}")
+        logger.error("Error extracting body content: %s", e)
         raise
 
 
@@ -113,33 +113,89 @@ def clean_body_content(body_content):
     """Clean body content by removing scripts and styles"""
     logger.info("Cleaning body content")
     try:
-        soup = BeautifulSoup(body_content, "html.parser")
-
-        # Remove script and style elements
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.extract()
-
-        # Get text content and clean whitespace
-        cleaned_content = soup.get_text(separator="\n")
-        cleaned_content = "\n".join(
-            line.strip() for line in cleaned_content.splitlines() if line.strip()
-        )
+        cleaned_content = clean_text(body_content)
 
         content_length = len(cleaned_content)
-        logger.info(f"Content cleaned successfully. Length: {content_length} characters")
+        logger.info("Content cleaned successfully. Length: %d characters", content_length)
         return cleaned_content
     except Exception as e:
-        logger.error(f"Error cleaning body content: {str(e)}")
+        logger.error("Error cleaning body content: %s", e)
         raise
 
 
 def split_dom_content(dom_content, max_length=6000):
     """Split DOM content into chunks of maximum length"""
-    logger.info(f"Splitting DOM content into chunks of max {max_length} characters")
+    logger.info("Splitting DOM content into chunks of max %d characters", max_length)
     chunks = [
         dom_content[i : i + max_length] for i in range(0, len(dom_content), max_length)
     ]
-    logger.info(f"Split into {len(chunks)} chunks")
+    logger.info("Split into %d chunks", len(chunks))
+    return chunks
+
+
+def split_dom_content_stable(
+    dom_content, max_length=6000, min_length=None, boundary_length=None
+):
+    """
+    Split DOM content into chunks whose boundaries depend on the content.
+
+    Chunks end on line breaks chosen by a hash of the line text, so an edit
+    in one part of a page only changes the chunks around it instead of
+    shifting every chunk that follows. This keeps chunk hashes comparable
+    between runs for incremental parsing.
+
+    Once a chunk reaches min_length, each line ends it with a probability
+    proportional to the line's length, so boundaries are spaced by
+    characters rather than by line count. With the defaults, chunks average
+    about 85% of max_length, and pages need about 15-20% more chunks (and
+    LLM calls on a full parse) than split_dom_content. In exchange, a local
+    edit usually changes only one chunk. Larger min_length values get closer
+    to max_length but force more hard cuts at max_length, which do not
+    depend on the content and make later chunks less stable.
+
+    Args:
+        dom_content: Cleaned text content to split
+        max_length: Maximum chunk length in characters
+        min_length: Minimum length before a content-defined boundary is used
+            (default: three quarters of max_length)
+        boundary_length: Average number of characters between candidate
+            boundaries once min_length is reached (default: max_length / 8)
+
+    Returns:
+        List of chunks
+    """
+    if min_length is None:
+        min_length = max_length * 3 // 4
+    if boundary_length is None:
+        boundary_length = max(max_length // 8, 1)
+
+    logger.info("Splitting DOM content into stable chunks of max %d characters", max_length)
+    chunks = []
+    current = []
+    current_length = 0
+
+    for line in dom_content.splitlines():
+        # Lines longer than max_length are split into fixed-size pieces
+        pieces = [line[i : i + max_length] for i in range(0, len(line), max_length)]
+        for piece in pieces:
+            if current and current_length + len(piece) + 1 > max_length:
+                chunks.append("\n".join(current))
+                current, current_length = [], 0
+
+            current.append(piece)
+            current_length += len(piece) + 1
+
+            # A line ends the chunk with probability len(line) / boundary_length
+            line_hash = zlib.crc32(piece.encode("utf-8"))
+            is_boundary = line_hash % boundary_length < len(piece) + 1
+            if current_length >= min_length and is_boundary:
+                chunks.append("\n".join(current))
+                current, current_length = [], 0
+
+    if current:
+        chunks.append("\n".join(current))
+
+    logger.info("Split into %d chunks", len(chunks))
     return chunks
 
 
@@ -148,6 +204,6 @@ if __name__ == "__main__":
     try:
         result = scrape_website("https://example.com")
         preview = result[:500] + "..." if len(result) > 500 else result
-        logger.info(f"Scraped content preview: {preview}")
+        logger.info("Scraped content preview: %s", preview)
     except Exception as e:
-        logger.error(f"Error in main execution: {str(e)}")
+        logger.error("Error in main execution: %s", e)